@@ -1,32 +1,84 @@
+import os
+import time
+import threading
+from collections import deque
+from functools import lru_cache
+from pathlib import Path
 from dotenv import load_dotenv
 from langchain_anthropic import ChatAnthropic
 from langchain.schema import AIMessage, HumanMessage, SystemMessage
 
 load_dotenv()
 
-chat_history = []
-
 model = ChatAnthropic(model='claude-3-5-sonnet-20240620')
 
-def load_content(path) -> str:
-    with open(path, "r", encoding="utf-8") as content:
+# requests per minute allowed to anthropic, shared by all threads calling send
+ANTHROPIC_RPM = int(os.getenv('ANTHROPIC_RPM', '5'))
+rate_lock = threading.Lock()
+next_slot = 0.0
+
+def wait_for_slot():
+    """Space calls evenly (leaky bucket) so concurrent senders stay under ANTHROPIC_RPM"""
+    global next_slot
+    with rate_lock:
+        now = time.monotonic()
+        slot = max(now, next_slot)
+        next_slot = slot + 60 / ANTHROPIC_RPM
+    time.sleep(slot - now)
+
+# tokens per minute allowed to anthropic, counted over a sliding one minute window
+ANTHROPIC_TPM = int(os.getenv('ANTHROPIC_TPM', '40000'))
+token_window = deque()  # [start time, tokens] of the calls made in the last minute
+
+def reserve_tokens(tokens):
+    """Wait until a call of about this many tokens fits under ANTHROPIC_TPM and count it in the window"""
+    while True:
+        with rate_lock:
+            now = time.monotonic()
+            while token_window and token_window[0][0] <= now - 60:
+                token_window.popleft()
+            if not token_window or sum(entry[1] for entry in token_window) + tokens <= ANTHROPIC_TPM:
+                entry = [now, tokens]
+                token_window.append(entry)
+                return entry
+            delay = token_window[0][0] + 60 - now
+        time.sleep(delay)
+
+STATIC_CONTENT = Path(__file__).parent / "static_content"
+
+@lru_cache(maxsize=None)
+def load_content(name) -> str:
+    with open(STATIC_CONTENT / name, "r", encoding="utf-8") as content:
         message = content.read()
     return message
 
-prompt_content = load_content("static_content\\unified-pr-endpoint-analysis_shortened.md")
+prompt_content = load_content("unified-pr-endpoint-analysis_shortened.md")
+
+system1 = load_content("spring-security-prompt-with-examples_shortened.txt")
+system2 = load_content("output_format.txt")
+
+# system messages are identical for every call, build them once
+SYSTEM_PREFIX = (
+    SystemMessage(content="you are a java spring security engineer. you will receive github project changes and help detecting if they have potentially security related vaulnerabilities in api endpoints, according to the following instructions"),
+    SystemMessage(content=system1),
+    SystemMessage(content=system2),
+)
+
+# the instructions are the same for every PR, the cache breakpoint after them lets
+# anthropic reuse the processed system messages + instructions prefix between calls
+PROMPT_BLOCK = {'type': 'text', 'text': prompt_content, 'cache_control': {'type': 'ephemeral'}}
 
-system1 = load_content("static_content\\spring-security-prompt-with-examples_shortened.txt")
-system2 = load_content("static_content\\output_format.txt")
-chat_history.append(SystemMessage(content="you are a java spring security engineer. you will receive github project changes and help detecting if they have potentially security related vaulnerabilities in api endpoints, according to the following instructions"))
-chat_history.append(SystemMessage(content=system1))
-chat_history.append(SystemMessage(content=system2))
+# rough size of the fixed part of every request, at ~4 characters per token
+PREFIX_TOKENS = (sum(len(message.content) for message in SYSTEM_PREFIX) + len(prompt_content)) // 4
 
 def send(new_message):
-    new_message = f'{prompt_content}\n-- PR CONTENT START --\n{new_message}'
-    chat_history.append(HumanMessage(content=new_message))  # Add user message
-    try:
-        result = model.invoke(chat_history)
-        response = result.content
-        return response
-    finally:
-        chat_history.pop()
+    new_message = f'-- PR CONTENT START --\n{new_message}'
+    wait_for_slot()
+    entry = reserve_tokens(PREFIX_TOKENS + len(new_message) // 4)
+    result = model.invoke([*SYSTEM_PREFIX, HumanMessage(content=[PROMPT_BLOCK, {'type': 'text', 'text': new_message}])])
+    if result.usage_metadata:
+        # replace the estimate with what anthropic actually counted
+        with rate_lock:
+            entry[1] = result.usage_metadata['total_tokens']
+    response = result.content
+    return response
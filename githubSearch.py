@@ -1,6 +1,8 @@
 from dotenv import load_dotenv
 
 import requests
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 import time
 from datetime import datetime
 import json
@@ -20,6 +22,11 @@ class GitHubSecurityScanner:
             'Accept': 'application/vnd.github.v3+json'
         }
         self.base_url = 'https://api.github.com'
+        # Keep-alive session so search pages reuse one TLS connection
+        self._session = requests.Session()
+        self._session.headers.update(self.headers)
+        retries = Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504], raise_on_status=False)
+        self._session.mount('https://', HTTPAdapter(max_retries=retries))
         self.rate_limit_remaining = None
         self.rate_limit_reset = None
 
@@ -52,7 +59,7 @@ class GitHubSecurityScanner:
                 'page': page
             }
             
-            response = requests.get(url, headers=self.headers, params=params)
+            response = self._session.get(url, params=params)
             self.update_rate_limit(response)
             
             if response.status_code != 200:
@@ -93,23 +100,25 @@ class GitHubSecurityScanner:
             'language:java (@RequestMapping OR @GetMapping OR @PostMapping) (hasRole OR hasAuthority OR isAuthenticated)'
         ]
 
-        results = []
-        for query in security_queries:
-            print(f"Searching with query: {query[:50]}...")
-            try:
-                for pr in self.search_security_prs(query):
-                    pr_data = self.analyze_pr(pr)
-                    results.append(pr_data)
-                    print(f"Found security PR: {pr_data['repository']}:{pr_data['number']}")
-            except Exception as e:
-                print(f"Error processing query '{query}': {str(e)}")
-                continue
-
-        # Save results to file
+        # Results are written as they arrive so memory stays flat on long scans
+        found = 0
         with open(output_file, 'w') as f:
-            json.dump(results, f, indent=2)
+            f.write('[')
+            for query in security_queries:
+                print(f"Searching with query: {query[:50]}...")
+                try:
+                    for pr in self.search_security_prs(query):
+                        pr_data = self.analyze_pr(pr)
+                        f.write(',\n  ' if found else '\n  ')
+                        f.write(json.dumps(pr_data))
+                        found += 1
+                        print(f"Found security PR: {pr_data['repository']}:{pr_data['number']}")
+                except Exception as e:
+                    print(f"Error processing query '{query}': {str(e)}")
+                    continue
+            f.write('\n]\n')
         
-        print(f"\nScan complete! Found {len(results)} security-related PRs")
+        print(f"\nScan complete! Found {found} security-related PRs")
         print(f"Results saved to {output_file}")
 
 def main():
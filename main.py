@@ -3,81 +3,129 @@ import os
 import sys
 import bot
 import time
-import json
+import random
+import argparse
 import requests
 import anthropic
 import pull_request_fetcher
+from concurrent.futures import ThreadPoolExecutor
 
-def print_usage():
-    print('usage:')
-    print('\tfull repo: main.py <repo owner>/<repo name>')
-    print('\tsingle PR: main.py <repo owner>/<repo name>:<PR number>')
+try:
+    import orjson
 
-def analyze(pr):
-    analysis = bot.send(json.dumps(pr))
-    print(f"[{pr['PR_TITLE']}]: {analysis}")
+    def to_json(pr):
+        return orjson.dumps(pr).decode()
+except ImportError:
+    import json
 
-if len(sys.argv) == 1 or sys.argv[1] == '':
-    limit = 100
-    with open('static_content/potential_prs.txt', 'r') as file:
-        with open('output.txt','w', encoding='utf-8') as out:
-            original_stdout = sys.stdout
-            sys.stdout = out
-            number = 0
+    def to_json(pr):
+        return json.dumps(pr, ensure_ascii=False, separators=(',', ':'))
+
+# number of PRs fetched and analyzed at the same time
+MAX_WORKERS = int(os.getenv('ANALYSIS_WORKERS', '8'))
+
+# backoff on anthropic overload: 30s, 1m, 2m, ... capped at 30 minutes
+OVERLOAD_RETRIES = 7
+OVERLOAD_BASE_DELAY = 30
+OVERLOAD_MAX_DELAY = 60 * 30
 
-            for line in file:
-                if not line.startswith("#"):
-                    parts = re.split('/|:', line)
-                    parts = [x.strip() for x in parts]
-                    try:
-                        header = f'PR: {parts[0]}/{parts[1]}:{parts[2]}'
-                        number += 1
-                        print(f'{number}: {header}', file = original_stdout)
+def parse_args():
+    parser = argparse.ArgumentParser(description='analyze github PRs for security related changes in spring api endpoints')
+    parser.add_argument('target', nargs='?', default='',
+                        help='<repo owner>/<repo name> for all the repo PRs, <repo owner>/<repo name>:<PR number> for a single PR, '
+                             'empty for the PRs listed in static_content/potential_prs.txt')
+    parser.add_argument('--limit', type=int, default=100, help='max number of PRs to analyze (default: %(default)s)')
+    parser.add_argument('--workers', type=int, default=MAX_WORKERS, help='PRs fetched and analyzed at the same time (default: %(default)s)')
+    parser.add_argument('--output', default='output.txt', help='result file for batch and full repo runs (default: %(default)s)')
+    return parser.parse_args()
+
+def read_potential_prs(limit):
+    prs = []
+    with open('static_content/potential_prs.txt', 'r') as file:
+        for line in file:
+            if not line.startswith("#"):
+                parts = re.split('/|:', line)
+                parts = [x.strip() for x in parts]
+                prs.append((parts[0], parts[1], int(parts[2])))
+                if len(prs) == limit:
+                    break
+    return prs
 
-                        pr = pull_request_fetcher.fetch_pr(parts[0], parts[1], int(parts[2]))
-                        print(header)
-                        print('-' * len(header))
-                        analyze(pr)
-                        print()
-                    except requests.HTTPError as e:
-                        if e.response.status_code == 404:
-                            print(f'cannot access {parts[0]}/{parts[1]}:{parts[2]}')
-                        else:
-                            raise e
-                    except anthropic.InternalServerError as e:
-                        print(f'anthropic error: {e}', file = original_stdout)
-                        if e.body['error']['type'] == 'overloaded_error':
-                            time.sleep(60 * 30)
-                        else:
-                            raise e
-                    except anthropic.BadRequestError as e:
-                        if e.body['error']['type'] == 'invalid_request_error' and e.body['error']['message'].startswith('prompt is too long'):
-                            print('skipping due to prompt size')
-                            print()
-                        else:
-                            print(f'anthropic error: {e}', file = original_stdout)
-                            raise e
-                    limit -= 1
-                    time.sleep(60)
-                    if limit == 0:
-                        break;
-                out.flush()
-elif len(sys.argv) != 2:
-    print_usage()
-else:
-    parts = re.split('/|:', sys.argv[1])
-    if len(parts) == 3:
-        # analyzing a specific PR 
+def send_with_backoff(message):
+    for attempt in range(OVERLOAD_RETRIES):
         try:
-            pr = pull_request_fetcher.fetch_pr(parts[0], parts[1], int(parts[2]))
-            analyze(pr)
-        except requests.HTTPError as e:
-            if e.response.status_code == 404:
-                print(f'cannot access {parts[0]}/{parts[1]}:{parts[2]}')
-            else:
+            return bot.send(message)
+        except anthropic.InternalServerError as e:
+            if e.body['error']['type'] != 'overloaded_error' or attempt == OVERLOAD_RETRIES - 1:
                 raise e
+            delay = min(OVERLOAD_BASE_DELAY * 2 ** attempt + random.uniform(0, OVERLOAD_BASE_DELAY), OVERLOAD_MAX_DELAY)
+            print(f'anthropic overloaded, retrying in {delay:.0f}s')
+            time.sleep(delay)
+
+def fetch_and_analyze(repo_owner, repo_name, pr_number):
+    pr = pull_request_fetcher.fetch_pr(repo_owner, repo_name, pr_number)
+    return pr, send_with_backoff(to_json(pr))
+
+def analyze_prs(prs, out, workers=MAX_WORKERS):
+    """
+    Fetch and analyze (owner, name, number) PR ids concurrently, bot.send paces the
+    anthropic calls. Results are written to out in the order of prs, progress goes to stdout
+    """
+    executor = ThreadPoolExecutor(max_workers=workers)
+    futures = [executor.submit(fetch_and_analyze, *pr_id) for pr_id in prs]
+    try:
+        for number, ((owner, name, pr_number), future) in enumerate(zip(prs, futures), start=1):
+            header = f'PR: {owner}/{name}:{pr_number}'
+            if out is not sys.stdout:
+                print(f'{number}: {header}')
+            try:
+                pr, analysis = future.result()
+                print(header, file = out)
+                print('-' * len(header), file = out)
+                print(f"[{pr['PR_TITLE']}]: {analysis}", file = out)
+                print(file = out)
+            except requests.HTTPError as e:
+                if e.response.status_code == 404:
+                    print(f'cannot access {owner}/{name}:{pr_number}', file = out)
+                else:
+                    raise e
+            except anthropic.InternalServerError as e:
+                print(f'anthropic error: {e}')
+                if e.body['error']['type'] != 'overloaded_error':
+                    raise e
+                # still overloaded after backing off, leave this PR out
+            except anthropic.BadRequestError as e:
+                if e.body['error']['type'] == 'invalid_request_error' and e.body['error']['message'].startswith('prompt is too long'):
+                    print(header, file = out)
+                    print('-' * len(header), file = out)
+                    print('skipping due to prompt size', file = out)
+                    print(file = out)
+                else:
+                    print(f'anthropic error: {e}')
+                    raise e
+            out.flush()
+    finally:
+        # don't start the remaining PRs if we stop on an error
+        executor.shutdown(cancel_futures=True)
+
+def main():
+    args = parse_args()
+    parts = re.split('/|:', args.target) if args.target else []
+
+    if not parts:
+        # analyzing the PRs listed in potential_prs.txt
+        with open(args.output, 'w', encoding='utf-8') as out:
+            analyze_prs(read_potential_prs(args.limit), out, args.workers)
+    elif len(parts) == 3:
+        # analyzing a specific PR
+        analyze_prs([(parts[0], parts[1], int(parts[2]))], sys.stdout, 1)
     elif len(parts) == 2:
         # analyzing all project PRs
-        pull_request_fetcher.__fetch
+        numbers = pull_request_fetcher.fetch_pr_numbers(parts[0], parts[1], args.limit)
+        with open(args.output, 'w', encoding='utf-8') as out:
+            analyze_prs([(parts[0], parts[1], number) for number in numbers], out, args.workers)
     else:
-        print_usage()
+        sys.exit(f'invalid target {args.target!r}, run main.py -h for usage')
+
+if __name__ == '__main__':
+    main()
@@ -1,5 +1,4 @@
 import fnmatch
-import re
 
 class GithubContentFilter:
     def __init__(self, security_analyzer):
@@ -19,19 +18,19 @@ class GithubContentFilter:
         matched_patterns = []
         
         for group_name, group_data in pattern_dict.items():
-            for pattern in group_data.get('patterns', []):
-                # Convert GitHub pattern to fnmatch-compatible pattern
-                modified_pattern = pattern.replace('**/', '**/').replace('{', '(').replace('}', ')')
-                
-                # Use regex to handle complex patterns
-                regex_pattern = modified_pattern.replace('.', r'\.').replace('*', '.*')
-                if re.search(regex_pattern, file_path):
-                    matched_patterns.append({
-                        'group': group_name,
-                        'pattern': pattern,
-                        'risk_score': group_data.get('risk_score', 0),
-                        'rationale': group_data.get('rationale', '')
-                    })
+            # Only run the group's regex on paths ending like one of its globs
+            if not file_path.endswith(group_data['_suffixes']):
+                continue
+
+            # Patterns are precompiled by the analyzer into one regex per group
+            match = group_data['_compiled'].fullmatch(file_path)
+            if match:
+                matched_patterns.append({
+                    'group': group_name,
+                    'pattern': group_data['patterns'][int(match.lastgroup[1:])],
+                    'risk_score': group_data.get('risk_score', 0),
+                    'rationale': group_data.get('rationale', '')
+                })
         
         return matched_patterns
 
@@ -54,32 +53,28 @@ class GithubContentFilter:
         for item in github_contents:
             file_path = item
             
-            # Check critical patterns
-            critical_matches = self._match_patterns(file_path, self.security_analyzer.critical_patterns)
-            if critical_matches:
-                filtered_contents['critical_risk'].append({
-                    'path': file_path,
-                    'matches': critical_matches
-                })
-                continue
-            
-            # Check high-risk patterns
-            high_risk_matches = self._match_patterns(file_path, self.security_analyzer.high_risk_patterns)
-            if high_risk_matches:
-                filtered_contents['high_risk'].append({
-                    'path': file_path,
-                    'matches': high_risk_matches
-                })
-                continue
+            # Paths not ending like any glob cannot match, skip the pattern regexes
+            if file_path.endswith(self.security_analyzer._suffix_gate):
+                # Check critical patterns
+                critical_matches = self._match_patterns(file_path, self.security_analyzer.critical_patterns)
+                if critical_matches:
+                    filtered_contents['critical_risk'].append({
+                        'path': file_path,
+                        'matches': critical_matches
+                    })
+                    continue
+
+                # Check high-risk patterns
+                high_risk_matches = self._match_patterns(file_path, self.security_analyzer.high_risk_patterns)
+                if high_risk_matches:
+                    filtered_contents['high_risk'].append({
+                        'path': file_path,
+                        'matches': high_risk_matches
+                    })
+                    continue
             
             # Check contextual paths
-            is_contextual = any(
-                any(context in file_path for context in contexts)
-                for contexts in [
-                    self.security_analyzer.contextual_patterns['configuration_locations'],
-                    self.security_analyzer.contextual_patterns['security_related_paths']
-                ]
-            )
+            is_contextual = bool(self.security_analyzer._context_rx.search(file_path))
             
             if is_contextual:
                 filtered_contents['high_risk'].append({
@@ -1,69 +1,155 @@
 from typing import Dict, List, Any
 import re
 
+# '**/', '*', '?', a '[...]' class, or a run of literal text
+_GLOB_TOKEN = re.compile(r'\*\*/|\*|\?|\[!?\]?[^\]]*\]|[^*?\[]+|\[')
+
+def _expand_glob(glob: str, globstar: bool = True):
+    """
+    Expand a GitHub-style glob into plain globs.
+
+    '{a,b}' alternatives are expanded, and unless globstar is False every '**/'
+    yields both the one-or-more directories form ('*/') and the zero directories form ('').
+    """
+    brace = glob.find('{')
+    if brace != -1:
+        end = glob.index('}', brace)
+        for option in glob[brace + 1:end].split(','):
+            yield from _expand_glob(glob[:brace] + option + glob[end + 1:], globstar)
+        return
+
+    star = glob.find('**/') if globstar else -1
+    if star != -1:
+        for tail in _expand_glob(glob[star + 3:]):
+            yield glob[:star] + '*/' + tail
+            yield glob[:star] + tail
+        return
+
+    yield glob
+
+def _glob_to_regex(glob: str) -> str:
+    """
+    Translate a GitHub-style glob into a regex string for fullmatch.
+
+    '*' and '?' stay within one path segment, while '**/' matches zero or more
+    whole directories, as in gitignore and GitHub's own path filters.
+    """
+    return '|'.join(
+        ''.join(_glob_token_to_regex(token) for token in _GLOB_TOKEN.findall(expanded))
+        for expanded in _expand_glob(glob, globstar=False)
+    )
+
+def _glob_token_to_regex(token: str) -> str:
+    """Translate one _GLOB_TOKEN match into its regex"""
+    if token == '**/':
+        return '(?:.*/)?'
+    if token == '*':
+        return '[^/]*'
+    if token == '?':
+        return '[^/]'
+    if token.startswith('[') and token.endswith(']') and len(token) > 2:
+        body = token[1:-1]
+        if body.startswith('!'):
+            body = '^' + body[1:]
+        return '[' + body.replace('\\', '\\\\') + ']'
+    return re.escape(token)
+
+def _literal_suffixes(globs) -> tuple:
+    """
+    Collect the literal suffixes a path must end with to match any of the globs,
+    dropping suffixes already covered by a shorter one ('.yml' covers '/secrets.yml')
+    """
+    suffixes = {
+        re.split(r'[*?\]]', expanded)[-1]
+        for glob in globs
+        for expanded in _expand_glob(glob)
+    }
+    return tuple(
+        suffix for suffix in suffixes
+        if not any(other != suffix and suffix.endswith(other) for other in suffixes)
+    )
+
+def _trie_regex(words) -> str:
+    """Build a regex matching any of the words, with common prefixes factored out"""
+    trie = {}
+    for word in words:
+        node = trie
+        for char in word:
+            node = node.setdefault(char, {})
+        node[''] = {}
+
+    def emit(node):
+        branches = [re.escape(char) + emit(child) for char, child in sorted(node.items()) if char]
+        if not branches:
+            return ''
+        regex = branches[0] if len(branches) == 1 and '' not in node else '(?:' + '|'.join(branches) + ')'
+        return regex + '?' if '' in node else regex
+
+    return emit(trie)
+
 class SpringSecurityAnalyzer:
     def __init__(self):
         # Core configuration patterns that almost always contain sensitive data
         self.critical_patterns = {
             "credential_files": {
                 "patterns": [
-                    ".*/application-prod\\.[properties|yml|yaml]",  # Production credentials
-                    ".*/application-staging\\.[properties|yml|yaml]",  # Staging credentials
-                    ".*/.env",  # Environment variables
-                    ".*/secrets\\.[properties|yml|yaml]",  # Explicit secrets files
-                    ".*/credentials\\.[properties|yml|yaml]",  # Additional credential files
-                    ".*/master\\.[properties|yml|yaml]",  # Master configuration files
-                    ".*/bootstrap-prod\\.[properties|yml|yaml]",  # Production bootstrap configs
-                    ".*/application-secure\\.[properties|yml|yaml]"  # Security-specific configs
+                    "**/application-prod.{properties,yml,yaml}",  # Production credentials
+                    "**/application-staging.{properties,yml,yaml}",  # Staging credentials
+                    "**/.env",  # Environment variables
+                    "**/secrets.{properties,yml,yaml}",  # Explicit secrets files
+                    "**/credentials.{properties,yml,yaml}",  # Additional credential files
+                    "**/master.{properties,yml,yaml}",  # Master configuration files
+                    "**/bootstrap-prod.{properties,yml,yaml}",  # Production bootstrap configs
+                    "**/application-secure.{properties,yml,yaml}"  # Security-specific configs
                 ],
                 "risk_score": 10,
                 "rationale": "Direct credential storage locations"
             },
             "security_configurations": {
                 "patterns": [
-                    ".*/src/.*/security/SecurityConfig.java",  # Spring Security config
-                    ".*/src/.*/security/SecurityConfig.java",  # Spring Security config
-                    ".*/src/.*/config/WebSecurityConfig.java",  # Web security settings
-                    ".*/src/.*/security/JwtConfig.java",  # JWT configuration
-                    ".*/oauth2/.*\\.[properties|yml|yaml]",  # OAuth2 settings
-                    ".*/saml/.*\\.[properties|yml|yaml]",  # SAML configurations
-                    ".*/src/.*/security/AuthorizationServerConfig.java",  # OAuth2 auth server
-                    ".*/src/.*/security/ResourceServerConfig.java",  # OAuth2 resource server
-                    ".*/src/.*/security/TokenConfig.java",  # Token management
-                    ".*/src/.*/security/MethodSecurityConfig.java",  # Method-level security
-                    ".*/src/.*/security/CorsSecurityConfig.java",  # CORS security
-                    ".*/src/.*/security/SessionSecurityConfig.java",  # Session management
-                    ".*/src/.*/security/SecurityBeanConfig.java"  # Security-related beans
+                    "**/src/**/security/SecurityConfig.java",  # Spring Security config
+                    "**/src/**/security/SecurityConfig.java",  # Spring Security config
+                    "**/src/**/config/WebSecurityConfig.java",  # Web security settings
+                    "**/src/**/security/JwtConfig.java",  # JWT configuration
+                    "**/oauth2/**/*.{properties,yml,yaml}",  # OAuth2 settings
+                    "**/saml/**/*.{properties,yml,yaml}",  # SAML configurations
+                    "**/src/**/security/AuthorizationServerConfig.java",  # OAuth2 auth server
+                    "**/src/**/security/ResourceServerConfig.java",  # OAuth2 resource server
+                    "**/src/**/security/TokenConfig.java",  # Token management
+                    "**/src/**/security/MethodSecurityConfig.java",  # Method-level security
+                    "**/src/**/security/CorsSecurityConfig.java",  # CORS security
+                    "**/src/**/security/SessionSecurityConfig.java",  # Session management
+                    "**/src/**/security/SecurityBeanConfig.java"  # Security-related beans
                 ],
                 "risk_score": 9,
                 "rationale": "Security framework configurations"
             },
             "encryption_materials": {
                 "patterns": [
-                    ".*/.*\\.[jks|keystore|truststore]",  # Java keystores
-                    ".*/.*\\.[key|pem|crt|cer|p12]",  # Certificates and private keys
-                    ".*/keys/.*\\.[properties|yml|yaml]",  # Encryption key configurations
-                    ".*/*.pfx",  # PKCS#12 archives
-                    ".*/*.der",  # DER-encoded certificates
-                    ".*/keystores/.*\\.[properties|yml|yaml]",  # Keystore configurations
-                    ".*/certificates/.*\\.[properties|yml|yaml]",  # Certificate configurations
-                    ".*/ssl/.*\\.[properties|yml|yaml]"  # SSL/TLS configurations
+                    "**/*.{jks,keystore,truststore}",  # Java keystores
+                    "**/*.{key,pem,crt,cer,p12}",  # Certificates and private keys
+                    "**/keys/**/*.{properties,yml,yaml}",  # Encryption key configurations
+                    "**/*.pfx",  # PKCS#12 archives
+                    "**/*.der",  # DER-encoded certificates
+                    "**/keystores/**/*.{properties,yml,yaml}",  # Keystore configurations
+                    "**/certificates/**/*.{properties,yml,yaml}",  # Certificate configurations
+                    "**/ssl/**/*.{properties,yml,yaml}"  # SSL/TLS configurations
                 ],
                 "risk_score": 10,
                 "rationale": "Cryptographic materials"
             },
             "authentication_configurations": {
                 "patterns": [
-                    ".*/src/.*/security/LdapConfig.java",  # LDAP authentication
-                    ".*/src/.*/security/OAuth2LoginConfig.java",  # OAuth2 login
-                    ".*/src/.*/security/SamlConfig.java",  # SAML configuration
-                    ".*/src/.*/security/KeycloakConfig.java",  # Keycloak integration
-                    ".*/src/.*/security/OpenIdConfig.java",  # OpenID Connect
-                    ".*/src/.*/security/AuthenticationConfig.java",  # Custom auth config
-                    ".*/src/.*/security/MfaConfig.java",  # Multi-factor auth
-                    ".*/src/.*/security/SocialLoginConfig.java",  # Social login
-                    ".*/authentication/.*\\.[properties|yml|yaml]",  # Auth properties
-                    ".*/src/.*/security/AuthProviderConfig.java"  # Custom auth providers
+                    "**/src/**/security/LdapConfig.java",  # LDAP authentication
+                    "**/src/**/security/OAuth2LoginConfig.java",  # OAuth2 login
+                    "**/src/**/security/SamlConfig.java",  # SAML configuration
+                    "**/src/**/security/KeycloakConfig.java",  # Keycloak integration
+                    "**/src/**/security/OpenIdConfig.java",  # OpenID Connect
+                    "**/src/**/security/AuthenticationConfig.java",  # Custom auth config
+                    "**/src/**/security/MfaConfig.java",  # Multi-factor auth
+                    "**/src/**/security/SocialLoginConfig.java",  # Social login
+                    "**/authentication/**/*.{properties,yml,yaml}",  # Auth properties
+                    "**/src/**/security/AuthProviderConfig.java"  # Custom auth providers
                 ],
                 "risk_score": 9,
                 "rationale": "Authentication mechanism configurations"
@@ -74,48 +160,48 @@ class SpringSecurityAnalyzer:
         self.high_risk_patterns = {
             "database_configs": {
                 "patterns": [
-                    ".*/resources/application\\.[properties|yml|yaml]",  # Main application config
-                    ".*/META-INF/persistence.xml",  # JPA configuration
-                    ".*/hibernate.cfg.xml",  # Hibernate configuration
-                    ".*/flyway\\.[properties|yml|yaml]",  # Database migration config
-                    ".*/liquibase/.*\\.[xml|yaml|sql]",  # Database changelog
-                    ".*/src/.*/repository/CustomRepositoryConfig.java",  # Custom repo configs
-                    ".*/src/.*/config/DataSourceConfig.java",  # DataSource configuration
-                    ".*/src/.*/config/JpaConfig.java",  # JPA specific config
-                    ".*/database/.*\\.[properties|yml|yaml]",  # Database properties
-                    ".*/jdbc/.*\\.[properties|yml|yaml]"  # JDBC configurations
+                    "**/resources/application.{properties,yml,yaml}",  # Main application config
+                    "**/META-INF/persistence.xml",  # JPA configuration
+                    "**/hibernate.cfg.xml",  # Hibernate configuration
+                    "**/flyway.{properties,yml,yaml}",  # Database migration config
+                    "**/liquibase/**/*.{xml,yaml,sql}",  # Database changelog
+                    "**/src/**/repository/CustomRepositoryConfig.java",  # Custom repo configs
+                    "**/src/**/config/DataSourceConfig.java",  # DataSource configuration
+                    "**/src/**/config/JpaConfig.java",  # JPA specific config
+                    "**/database/**/*.{properties,yml,yaml}",  # Database properties
+                    "**/jdbc/**/*.{properties,yml,yaml}"  # JDBC configurations
                 ],
                 "risk_score": 8,
                 "rationale": "Database connection strings and credentials"
             },
             "service_integration": {
                 "patterns": [
-                    ".*/integration/.*\\.[properties|yml|yaml]",  # Service integration configs
-                    ".*/client/.*\\.[properties|yml|yaml]",  # Client configurations
-                    ".*/api/.*\\.[properties|yml|yaml]",  # API configurations
-                    ".*/src/.*/client/RestTemplateConfig.java",  # REST client config
-                    ".*/src/.*/client/FeignClientConfig.java",  # Feign client config
-                    ".*/src/.*/integration/WebClientConfig.java",  # WebClient config
-                    ".*/src/.*/config/MessageConfig.java",  # Messaging config
-                    ".*/src/.*/integration/KafkaConfig.java",  # Kafka integration
-                    ".*/src/.*/integration/RabbitConfig.java",  # RabbitMQ integration
-                    ".*/microservices/.*\\.[properties|yml|yaml]"  # Microservice configs
+                    "**/integration/**/*.{properties,yml,yaml}",  # Service integration configs
+                    "**/client/**/*.{properties,yml,yaml}",  # Client configurations
+                    "**/api/**/*.{properties,yml,yaml}",  # API configurations
+                    "**/src/**/client/RestTemplateConfig.java",  # REST client config
+                    "**/src/**/client/FeignClientConfig.java",  # Feign client config
+                    "**/src/**/integration/WebClientConfig.java",  # WebClient config
+                    "**/src/**/config/MessageConfig.java",  # Messaging config
+                    "**/src/**/integration/KafkaConfig.java",  # Kafka integration
+                    "**/src/**/integration/RabbitConfig.java",  # RabbitMQ integration
+                    "**/microservices/**/*.{properties,yml,yaml}"  # Microservice configs
                 ],
                 "risk_score": 7,
                 "rationale": "Service-to-service communication settings"
             },
             "cloud_configurations": {
                 "patterns": [
-                    ".*/cloud/.*\\.[properties|yml|yaml]",  # Cloud configurations
-                    ".*/aws/.*\\.[properties|yml|yaml]",  # AWS specific configs
-                    ".*/azure/.*\\.[properties|yml|yaml]",  # Azure specific configs
-                    ".*/gcp/.*\\.[properties|yml|yaml]",  # Google Cloud configs
-                    ".*/kubernetes/.*\\.[properties|yml|yaml]",  # Kubernetes configs
-                    ".*/docker/.*\\.[properties|yml|yaml]",  # Docker configurations
-                    ".*/consul/.*\\.[properties|yml|yaml]",  # Consul configurations
-                    ".*/eureka/.*\\.[properties|yml|yaml]",  # Eureka configurations
-                    ".*/src/.*/cloud/CloudConfig.java",  # Cloud-specific configurations
-                    ".*/src/.*/config/DiscoveryConfig.java"  # Service discovery configs
+                    "**/cloud/**/*.{properties,yml,yaml}",  # Cloud configurations
+                    "**/aws/**/*.{properties,yml,yaml}",  # AWS specific configs
+                    "**/azure/**/*.{properties,yml,yaml}",  # Azure specific configs
+                    "**/gcp/**/*.{properties,yml,yaml}",  # Google Cloud configs
+                    "**/kubernetes/**/*.{properties,yml,yaml}",  # Kubernetes configs
+                    "**/docker/**/*.{properties,yml,yaml}",  # Docker configurations
+                    "**/consul/**/*.{properties,yml,yaml}",  # Consul configurations
+                    "**/eureka/**/*.{properties,yml,yaml}",  # Eureka configurations
+                    "**/src/**/cloud/CloudConfig.java",  # Cloud-specific configurations
+                    "**/src/**/config/DiscoveryConfig.java"  # Service discovery configs
                 ],
                 "risk_score": 8,
                 "rationale": "Cloud platform configurations"
@@ -134,7 +220,7 @@ class SpringSecurityAnalyzer:
                 "ansible",  # Configuration management
                 "deployment",  # Deployment scripts
                 "scripts",  # Utility scripts
-                "\\.github/workflows"  # CI/CD configurations
+                ".github/workflows"  # CI/CD configurations
             ],
             "security_related_paths": [
                 "security",
@@ -154,6 +240,38 @@ class SpringSecurityAnalyzer:
                 "identity"
             ]
         }
+
+        # Compile each group's globs into a single regex, one named group per pattern,
+        # so a path is scanned once per group and match.lastgroup tells which pattern hit
+        for pattern_dict in (self.critical_patterns, self.high_risk_patterns):
+            for group_data in pattern_dict.values():
+                group_data['_compiled'] = re.compile('|'.join(
+                    f'(?P<g{i}>{_glob_to_regex(pattern)})'
+                    for i, pattern in enumerate(group_data['patterns'])
+                ))
+
+        # Every glob is anchored at the end, so a path can only match a group if it ends
+        # with the literal text after one of the group's last wildcards. Each group keeps
+        # its own suffixes so it only runs on its candidates, and their union lets most
+        # paths skip the pattern regexes altogether
+        for pattern_dict in (self.critical_patterns, self.high_risk_patterns):
+            for group_data in pattern_dict.values():
+                group_data['_suffixes'] = _literal_suffixes(group_data['patterns'])
+        self._suffix_gate = _literal_suffixes(
+            pattern
+            for pattern_dict in (self.critical_patterns, self.high_risk_patterns)
+            for group_data in pattern_dict.values()
+            for pattern in group_data['patterns']
+        )
+
+        # Contextual paths are plain substrings. A token containing another one never
+        # changes the outcome ('authentication' contains 'auth'), and the rest are
+        # compiled as a trie so the regex engine never retries a shared prefix
+        contexts = [context for contexts in self.contextual_patterns.values() for context in contexts]
+        self._context_rx = re.compile(_trie_regex(
+            context for context in contexts
+            if not any(other != context and other in context for other in contexts)
+        ))
     
     def filter_paths(self, paths) -> Dict[str, List[str]]:
         """
@@ -172,23 +290,22 @@ class SpringSecurityAnalyzer:
         }
 
         for item in paths:
-            # Check critical patterns
-            for category, patterns in self.critical_patterns.items():
-                if any(re.search(pattern, item['path']) for pattern in patterns):
-                    filtered_paths['critical_matches'].append((item['path'], item['size']))
-                    break
-            
-            # Check high-risk patterns
-            for category, patterns in self.high_risk_patterns.items():
-                if any(re.search(pattern, item['path']) for pattern in patterns):
-                    filtered_paths['high_risk_matches'].append((item['path'], item['size']))
-                    break
+            if item['path'].endswith(self._suffix_gate):
+                # Check critical patterns
+                for category, group_data in self.critical_patterns.items():
+                    if item['path'].endswith(group_data['_suffixes']) and group_data['_compiled'].fullmatch(item['path']):
+                        filtered_paths['critical_matches'].append((item['path'], item['size']))
+                        break
+
+                # Check high-risk patterns
+                for category, group_data in self.high_risk_patterns.items():
+                    if item['path'].endswith(group_data['_suffixes']) and group_data['_compiled'].fullmatch(item['path']):
+                        filtered_paths['high_risk_matches'].append((item['path'], item['size']))
+                        break
 
             # Check contextual patterns
-            for category, patterns in self.contextual_patterns.items():
-                if any(re.search(pattern, item['path']) for pattern in patterns):
-                    filtered_paths['contextual_matches'].append((item['path'], item['size']))
-                    break
+            if self._context_rx.search(item['path']):
+                filtered_paths['contextual_matches'].append((item['path'], item['size']))
         
         return filtered_paths
 
@@ -3,9 +3,21 @@ import json
 from pathlib import Path
 from typing import Dict, List, Set
 import re
+import ijson
 from datetime import datetime
+from concurrent.futures import ProcessPoolExecutor
 import requests
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Keep-alive session so GitHub calls reuse pooled TLS connections, transient errors are retried
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504], raise_on_status=False)
+))
 
 class GithubRepoScanner:
     def __init__(self, token):
@@ -18,9 +30,16 @@ class GithubRepoScanner:
     def get_repo_structure(self, owner: str, repo: str) -> List[str]:
         base_url = f"https://api.github.com/repos/{owner}/{repo}/git/trees/main?recursive=1"
         try:
-            response = requests.get(base_url, headers=self.headers)
-            response.raise_for_status()
-            return sorted([item['path'] for item in response.json().get('tree', [])])
+            with _SESSION.get(base_url, headers=self.headers, stream=True) as response:
+                response.raise_for_status()
+
+                # Only the paths are kept, so parse them off the stream instead of
+                # decoding the whole tree JSON first
+                response.raw.decode_content = True
+                paths = [item['path'] for item in ijson.items(response.raw, 'tree.item')]
+
+            paths.sort()
+            return paths
         except requests.exceptions.RequestException as e:
             print(f"Error fetching repository: {e}")
             return []
@@ -64,28 +83,53 @@ class SpringSecurityScanner:
            }
         }
        
-        self.sensitive_directories = {
+        self.sensitive_directories = frozenset({
             "security", "auth", "oauth2", "jwt", "keys",
             "certificates", "credentials", "secrets"
+        })
+
+        # Patterns are compiled once. Most files match none of them, so a single union
+        # of every pattern rejects those before the per-pattern checks run
+        self._compiled_patterns = {
+            category: [(pattern, re.compile(pattern, re.IGNORECASE)) for pattern in config['patterns']]
+            for category, config in self.sensitive_patterns.items()
         }
+        self._any_pattern = re.compile(
+            '|'.join(f'(?:{pattern})' for config in self.sensitive_patterns.values() for pattern in config['patterns']),
+            re.IGNORECASE
+        )
 
     def scan_github_paths(self, paths: List[str]) -> List[Dict]:
         findings = []
-        
+
+        # A tree has far fewer distinct directories and file names than paths, so the
+        # directory check runs once per directory and the patterns once per file name
+        sensitive_parents = {}
+        name_matches = {}
+        location_match = self._analyze_path('', True)
+
         for path in paths:
-            path_parts = Path(path).parts
-            
-            is_sensitive_dir = any(part.lower() in self.sensitive_directories 
-                                 for part in path_parts)
-            
-            matches = self._analyze_path(path, is_sensitive_dir)
+            parent, _, name = path.rpartition('/')
+            name = name.lower()
+
+            is_sensitive_dir = sensitive_parents.get(parent)
+            if is_sensitive_dir is None:
+                is_sensitive_dir = sensitive_parents[parent] = not self.sensitive_directories.isdisjoint(parent.lower().split('/'))
+
+            matches = name_matches.get(name)
+            if matches is None:
+                matches = name_matches[name] = self._analyze_path(name, False)
+
+            if not matches and (is_sensitive_dir or name in self.sensitive_directories):
+                matches = location_match
+
             if matches:
                 findings.append({
                     'file': path,
                     'matches': matches,
                     'context': {
-                        'parent_directory': str(Path(path).parent),
-                        'path_parts': path_parts
+                        'parent_directory': parent or '.',
+                        'path_parts': tuple(path.split('/'))
                     }
                 })
         
@@ -93,16 +137,17 @@ class SpringSecurityScanner:
 
     def _analyze_path(self, path: str, is_sensitive_dir: bool) -> List[Dict]:
         matches = []
-        file_name = Path(path).name.lower()
+        file_name = path.rsplit('/', 1)[-1].lower()
         
-        for category, config in self.sensitive_patterns.items():
-            for pattern in config['patterns']:
-                if re.match(pattern, file_name, re.IGNORECASE):
-                    matches.append({
-                        'category': category,
-                        'severity': config['severity'],
-                        'matched_pattern': pattern
-                    })
+        if self._any_pattern.match(file_name):
+            for category, patterns in self._compiled_patterns.items():
+                for pattern, compiled in patterns:
+                    if compiled.match(file_name):
+                        matches.append({
+                            'category': category,
+                            'severity': self.sensitive_patterns[category]['severity'],
+                            'matched_pattern': pattern
+                        })
         
         if is_sensitive_dir and not matches:
             matches.append({
@@ -127,15 +172,16 @@ class SpringSecurityScanner:
             dirs = sorted((k, v) for k, v in tree.items() if v)
             files = sorted(k for k, v in tree.items() if not v)
 
+            child_prefix = prefix + indent
             for name, subtree in dirs:
                 lines.append(prefix + name + "/")
-                lines.extend(format_tree_dict(subtree, prefix + indent, max_files))
+                lines.extend(format_tree_dict(subtree, child_prefix, max_files))
 
             if len(files) > max_files:
-                lines.extend(prefix + indent + f for f in files[:max_files-1])
-                lines.append(prefix + indent + f"... ({len(files)-max_files+1} more files)")
+                lines.extend([child_prefix + f for f in files[:max_files-1]])
+                lines.append(child_prefix + f"... ({len(files)-max_files+1} more files)")
             else:
-                lines.extend(prefix + indent + f for f in files)
+                lines.extend([child_prefix + f for f in files])
             
             return lines
 
@@ -162,11 +208,16 @@ def main():
         print("No files found or error occurred")
         return
 
-    print("\nRepository Structure:")
-    print(security_scanner.format_github_tree(paths))
+    # Formatting and scanning are independent pure Python work, the scan runs in a
+    # second process (threads would just take turns on the GIL)
+    with ProcessPoolExecutor(max_workers=1) as executor:
+        scan = executor.submit(security_scanner.scan_github_paths, paths)
+
+        print("\nRepository Structure:")
+        print(security_scanner.format_github_tree(paths))
 
-    print("\nScanning for sensitive files...")
-    findings = security_scanner.scan_github_paths(paths)
+        print("\nScanning for sensitive files...")
+        findings = scan.result()
 
     severity_groups = {'CRITICAL': [], 'HIGH': [], 'MEDIUM': [], 'LOW': []}
     for finding in findings:
@@ -1,6 +1,31 @@
 import requests
 import os
 from datetime import datetime
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+
+# Keep-alive session so GitHub calls reuse pooled TLS connections, transient errors are retried
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504], raise_on_status=False)
+))
+
+# (url, accept) -> (etag, response), a 304 on revalidation reuses the stored response
+_ETAG_CACHE = {}
+
+def _get(url, headers):
+    cached = _ETAG_CACHE.get((url, headers['Accept']))
+    if cached:
+        headers = {**headers, 'If-None-Match': cached[0]}
+    response = _SESSION.get(url, headers=headers)
+    if cached and response.status_code == 304:
+        return cached[1]
+    response.raise_for_status()
+    if 'ETag' in response.headers:
+        _ETAG_CACHE[(url, headers['Accept'])] = (response.headers['ETag'], response)
+    return response
 
 def get_commit_changes(repo_owner, repo_name, commit_sha, access_token=None):
     """
@@ -28,15 +53,13 @@ def get_commit_changes(repo_owner, repo_name, commit_sha, access_token=None):
     
     try:
         # Get commit details
-        response = requests.get(api_url, headers=headers)
-        response.raise_for_status()
+        response = _get(api_url, headers)
         commit_data = response.json()
         
         # Get the commit diff
         diff_headers = headers.copy()
         diff_headers['Accept'] = 'application/vnd.github.v3.diff'
-        diff_response = requests.get(api_url, headers=diff_headers)
-        diff_response.raise_for_status()
+        diff_response = _get(api_url, diff_headers)
         raw_diff = diff_response.text
         
         # Process commit information
@@ -49,20 +72,13 @@ def get_commit_changes(repo_owner, repo_name, commit_sha, access_token=None):
                 'message': commit_data['commit']['message']
             },
             'stats': commit_data['stats'],
-            'files': []
+            'files': commit_data['files']
         }
         
-        # Process each changed file
+        # GitHub's file entries already carry filename, status and the counts,
+        # only binary or oversized files come without a patch
         for file in commit_data['files']:
-            file_info = {
-                'filename': file['filename'],
-                'status': file['status'],
-                'additions': file['additions'],
-                'deletions': file['deletions'],
-                'changes': file['changes'],
-                'patch': file.get('patch', '')
-            }
-            changes['files'].append(file_info)
+            file.setdefault('patch', '')
         
         return changes, raw_diff
     
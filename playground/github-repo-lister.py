@@ -1,10 +1,22 @@
+import ijson
 import requests
+import tarfile
 import os
 from dotenv import load_dotenv
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
 
 from SpringSecurityAnalyzer import SpringSecurityAnalyzer
 
-def list_github_repo_contents(owner, repo, branch, token):
+# Keep-alive session so GitHub calls reuse pooled TLS connections, transient errors are retried
+_SESSION = requests.Session()
+_SESSION.mount('https://', HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504], raise_on_status=False)
+))
+
+def list_github_repo_contents(owner, repo, branch, token, session=None):
     """
     List all file and directory paths in a GitHub repository.
     
@@ -12,6 +24,7 @@ def list_github_repo_contents(owner, repo, branch, token):
         owner (str): GitHub repository owner username
         repo (str): Repository name
         token (str): GitHub personal access token
+        session (requests.Session): Optional session, defaults to the module keep-alive session
     
     Returns:
         list: Sorted list of full file and directory paths
@@ -28,13 +41,36 @@ def list_github_repo_contents(owner, repo, branch, token):
     
     try:
         # Get repository contents
-        response = requests.get(base_url, headers=headers)
-        response.raise_for_status()
-        
-        contents = response.json()
-        
-        # Extract paths from the tree
-        all_paths = [{'path': item['path'], 'size': item.get('size', None)} for item in contents.get('tree', [])]
+        with (session or _SESSION).get(base_url, headers=headers, stream=True) as response:
+            response.raise_for_status()
+
+            # Extract paths while streaming the tree instead of decoding it whole
+            response.raw.decode_content = True
+            all_paths = []
+            truncated = False
+            builder = None
+            for prefix, event, value in ijson.parse(response.raw):
+                if prefix == 'truncated':
+                    truncated = value
+                elif prefix.startswith('tree.item'):
+                    if prefix == 'tree.item' and event == 'start_map':
+                        builder = ijson.ObjectBuilder()
+                    builder.event(event, value)
+                    if prefix == 'tree.item' and event == 'end_map':
+                        all_paths.append({'path': builder.value['path'], 'size': builder.value.get('size', None)})
+
+        if truncated:
+            # GitHub caps recursive trees; the tarball headers list every path of the branch
+            all_paths = []
+            tarball_url = f"https://api.github.com/repos/{owner}/{repo}/tarball/{branch}"
+            with (session or _SESSION).get(tarball_url, headers=headers, stream=True) as response:
+                response.raise_for_status()
+                with tarfile.open(fileobj=response.raw, mode='r|gz') as tar:
+                    for info in tar:
+                        # Member names are prefixed with an '{owner}-{repo}-{sha}/' directory
+                        parts = info.name.split('/', 1)
+                        if len(parts) == 2:
+                            all_paths.append({'path': parts[1], 'size': info.size if info.isreg() else None})
 
         return all_paths
     
@@ -1,24 +1,121 @@
 import os
+import re
+import heapq
+import ijson
+import tarfile
 import requests
-from typing import Dict, List, Set, Optional
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from typing import Dict, Iterator, List, Set, Optional
 from dataclasses import dataclass
 import base64
-from urllib.parse import urlparse
 import networkx as nx
 from collections import defaultdict
 from dotenv import load_dotenv
 
-@dataclass
+# 'owner/repo' or a github.com / api.github.com URL; scheme, .git, sub-path, query and fragment are optional
+REPO_RX = re.compile(
+    r'^(?:(?:https?://)?(?:www\.)?(?:api\.github\.com/repos|github\.com)/)?'
+    r'(?P<owner>[^/\s?#]+)/(?P<repo>[^/\s?#]+?)(?:\.git)?(?:[/?#].*)?$'
+)
+
+def iter_tree_items(raw, tree: Dict) -> Iterator[Dict]:
+    """Stream the entries of a git tree response, recording its 'truncated' flag in tree"""
+    builder = None
+    for prefix, event, value in ijson.parse(raw):
+        if prefix == 'truncated':
+            tree['truncated'] = value
+        elif prefix.startswith('tree.item'):
+            if prefix == 'tree.item' and event == 'start_map':
+                builder = ijson.ObjectBuilder()
+            builder.event(event, value)
+            if prefix == 'tree.item' and event == 'end_map':
+                yield builder.value
+
+@dataclass(slots=True)
 class RepoFile:
     path: str
     type: str  # 'file' or 'dir'
     size: int
     security_score: float = 0.0
-    dependencies: Set[str] = None
+    dependencies: Optional[Set[str]] = None  # created on first add_dependency
     
-    def __post_init__(self):
+    def add_dependency(self, dependency: str):
         if self.dependencies is None:
             self.dependencies = set()
+        self.dependencies.add(dependency)
+
+# High-priority patterns
+SECURITY_PATTERNS = {
+    'critical': {
+        'auth', 'security', 'permission', 'acl', 'rbac', 'role', 
+        'privilege', 'credential', 'secret', 'password', 'token'
+    },
+    'important': {
+        'config', 'setting', 'middleware', 'interceptor', 'filter',
+        'policy', 'validation', 'sanitize', 'encrypt'
+    },
+    'relevant': {
+        'user', 'admin', 'account', 'profile', 'session', 'login',
+        'access', 'guard', 'protect'
+    }
+}
+SECURITY_PATTERN_WEIGHTS = {'critical': 0.4, 'important': 0.2, 'relevant': 0.1}
+
+# File location scoring
+LOCATION_PATTERNS = {
+    'security/': 0.8,
+    'auth/': 0.8,
+    'src/': 0.3,
+    'lib/': 0.3,
+    'test/': -0.2  # Lower priority for test files
+}
+
+# File type scoring
+SECURITY_FILE_PATTERNS = {
+    'config.': 0.3,
+    '.env': 0.4,
+    'security.': 0.4,
+    'auth.': 0.4,
+    'middleware.': 0.3,
+    'policy.': 0.3
+}
+
+def _build_score_tokens() -> Dict[str, float]:
+    """Flatten all scoring patterns into a single token -> weight table, built once at import"""
+    weights = defaultdict(float)
+    for level, patterns in SECURITY_PATTERNS.items():
+        for pattern in patterns:
+            weights[pattern] += SECURITY_PATTERN_WEIGHTS[level]
+    for patterns in (LOCATION_PATTERNS, SECURITY_FILE_PATTERNS):
+        for pattern, weight in patterns.items():
+            weights[pattern] += weight
+    return dict(weights)
+
+SCORE_TOKEN_WEIGHTS = _build_score_tokens()
+
+def _score_path(path_lower: str) -> float:
+    """Calculate initial security score of a lowercased path based on its naming"""
+    score = 0.0
+    for token, weight in SCORE_TOKEN_WEIGHTS.items():
+        if token in path_lower:
+            score += weight
+
+    return min(max(score, 0.0), 1.0)
+
+# Changed file paths of a pull request, paginated by cursor
+PR_FILES_QUERY = '''
+query($owner: String!, $name: String!, $pr: Int!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $pr) {
+      files(first: 100, after: $cursor) {
+        nodes { path }
+        pageInfo { hasNextPage endCursor }
+      }
+    }
+  }
+}
+'''
 
 class GitHubSecurityAnalyzer:
     def __init__(self, repo_url: str, github_token: Optional[str] = None):
@@ -37,155 +134,151 @@ class GitHubSecurityAnalyzer:
             "X-GitHub-Api-Version": "2022-11-28"
         }
         self.base_url = f'https://api.github.com/repos/{self.repo_owner}/{self.repo_name}'
+        # Keep-alive session so all GitHub calls reuse one TLS connection
+        self._session = requests.Session()
+        self._session.headers.update(self.headers)
+        retries = Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504], raise_on_status=False)
+        self._session.mount('https://', HTTPAdapter(max_retries=retries))
         self.dependency_graph = nx.DiGraph()
+        # ref -> (ETag, scored files) of the last fetched tree
+        self._tree_cache = {}
+        # lowercased path -> security score, shared by tree and PR scoring
+        self._score_cache: Dict[str, float] = {}
 
     def _parse_repo_info(self, repo_url: str) -> tuple[str, str]:
         """Extract owner and repo name from URL or string"""
-        # Handle full URLs
-        if '/' in repo_url and ('github.com' in repo_url or 'api.github.com' in repo_url):
-            parsed = urlparse(repo_url)
-            parts = parsed.path.strip('/').split('/')
-            return parts[0], parts[1]
-        # Handle owner/repo format
-        elif '/' in repo_url:
-            owner, repo = repo_url.split('/')
-            return owner, repo
-        else:
+        match = REPO_RX.match(repo_url.strip())
+        if not match:
             raise ValueError("Invalid repository format. Use 'owner/repo' or full GitHub URL")
+        return match['owner'], match['repo']
 
-    def get_repo_structure(self) -> List[RepoFile]:
+    def get_repo_structure(self, ref: str = 'master') -> List[RepoFile]:
         """Get repository structure with initial security scoring"""
+        headers = {}
+        cached = self._tree_cache.get(ref)
+        if cached:
+            # GitHub answers 304 when the tree did not change since the cached ETag
+            headers['If-None-Match'] = cached[0]
+
         try:
-            response = requests.get(
-                f'{self.base_url}/git/trees/master?recursive=1',
-                headers=self.headers
-            )
-            response.raise_for_status()
-            
-            files = []
-            for item in response.json().get('tree', []):
-                if item['type'] != 'blob':
-                    continue
-                
-                file = RepoFile(
-                    path=item['path'],
-                    type=item['type'],
-                    size=item.get('size', 0)
-                )
-                file.security_score = self._calculate_initial_security_score(file)
-                files.append(file)
-            
-            return files
+            with self._session.get(
+                f'{self.base_url}/git/trees/{ref}?recursive=1',
+                headers=headers,
+                stream=True
+            ) as response:
+                if cached and response.status_code == 304:
+                    return list(cached[1])
+                response.raise_for_status()
+
+                # Parse the tree straight off the socket so only the RepoFile objects
+                # are kept, not the whole decoded JSON tree next to them
+                response.raw.decode_content = True
+                tree = {'truncated': False}
+                files = []
+                for item in iter_tree_items(response.raw, tree):
+                    if item['type'] != 'blob':
+                        continue
+
+                    file = RepoFile(
+                        path=item['path'],
+                        type=item['type'],
+                        size=item.get('size', 0)
+                    )
+                    file.security_score = self._score(file.path)
+                    files.append(file)
+
+                etag = response.headers.get('ETag')
+
+            if tree['truncated']:
+                # GitHub caps recursive trees; the tarball lists every file of the ref
+                files = self._get_tarball_files(ref)
+
+            if etag:
+                self._tree_cache[ref] = (etag, files)
+            return list(files)
             
         except requests.exceptions.RequestException as e:
             raise Exception(f"Failed to fetch repository structure: {str(e)}")
 
-    def _calculate_initial_security_score(self, file: RepoFile) -> float:
-        """Calculate initial security score based on file path and naming"""
-        score = 0.0
-        path_lower = file.path.lower()
-        
-        # High-priority patterns
-        security_patterns = {
-            'critical': {
-                'auth', 'security', 'permission', 'acl', 'rbac', 'role', 
-                'privilege', 'credential', 'secret', 'password', 'token'
-            },
-            'important': {
-                'config', 'setting', 'middleware', 'interceptor', 'filter',
-                'policy', 'validation', 'sanitize', 'encrypt'
-            },
-            'relevant': {
-                'user', 'admin', 'account', 'profile', 'session', 'login',
-                'access', 'guard', 'protect'
-            }
-        }
-        
-        # File location scoring
-        location_patterns = {
-            'security/': 0.8,
-            'auth/': 0.8,
-            'src/': 0.3,
-            'lib/': 0.3,
-            'test/': -0.2  # Lower priority for test files
-        }
-        
-        # Check patterns
-        for pattern in security_patterns['critical']:
-            if pattern in path_lower:
-                score += 0.4
-                
-        for pattern in security_patterns['important']:
-            if pattern in path_lower:
-                score += 0.2
-                
-        for pattern in security_patterns['relevant']:
-            if pattern in path_lower:
-                score += 0.1
-                
-        # Check location
-        for loc, weight in location_patterns.items():
-            if loc in path_lower:
-                score += weight
-        
-        # Check file type
-        security_file_patterns = {
-            'config.': 0.3,
-            '.env': 0.4,
-            'security.': 0.4,
-            'auth.': 0.4,
-            'middleware.': 0.3,
-            'policy.': 0.3
-        }
-        
-        for pattern, weight in security_file_patterns.items():
-            if pattern in path_lower:
-                score += weight
-        
-        return min(max(score, 0.0), 1.0)
+    def _get_tarball_files(self, ref: str) -> List[RepoFile]:
+        """List the files of a ref from its tarball headers, used when the tree is truncated"""
+        files = []
+        with self._session.get(f'{self.base_url}/tarball/{ref}', stream=True) as response:
+            response.raise_for_status()
+            # Stream mode reads header by header and skips over the file data
+            with tarfile.open(fileobj=response.raw, mode='r|gz') as tar:
+                for info in tar:
+                    # Member names are prefixed with an '{owner}-{repo}-{sha}/' directory
+                    parts = info.name.split('/', 1)
+                    if len(parts) < 2 or not info.isreg():
+                        continue
+
+                    file = RepoFile(path=parts[1], type='blob', size=info.size)
+                    file.security_score = self._score(file.path)
+                    files.append(file)
+        return files
+
+    def _score(self, path: str) -> float:
+        """Initial security score of a path, computed once per analyzer"""
+        path_lower = path.lower()
+        score = self._score_cache.get(path_lower)
+        if score is None:
+            score = self._score_cache[path_lower] = _score_path(path_lower)
+        return score
 
     def get_critical_files(self, max_files: int = 5) -> List[RepoFile]:
         """Get most security-critical files based on scoring"""
         all_files = self.get_repo_structure()
         
-        # Sort by security score
-        critical_files = sorted(
-            all_files, 
-            key=lambda x: x.security_score, 
-            reverse=True
-        )
-        
-        return critical_files[:max_files]
+        # Only the top max_files are needed, no need to sort the whole tree
+        return heapq.nlargest(max_files, all_files, key=lambda x: x.security_score)
+
+    def _get_pr_file_paths(self, pr_number: int) -> List[str]:
+        """Get the paths changed by a PR, 100 per GraphQL request with only the path selected"""
+        paths = []
+        cursor = None
+        while True:
+            response = self._session.post(
+                'https://api.github.com/graphql',
+                json={
+                    'query': PR_FILES_QUERY,
+                    'variables': {'owner': self.repo_owner, 'name': self.repo_name, 'pr': pr_number, 'cursor': cursor}
+                }
+            )
+            response.raise_for_status()
+
+            result = response.json()
+            if 'errors' in result:
+                raise requests.exceptions.RequestException(result['errors'][0]['message'])
+
+            files = result['data']['repository']['pullRequest']['files']
+            paths.extend(node['path'] for node in files['nodes'])
+            if not files['pageInfo']['hasNextPage']:
+                return paths
+            cursor = files['pageInfo']['endCursor']
 
     def analyze_pr_context(self, pr_number: int, max_context_files: int = 3) -> Dict:
         """Analyze security context for a PR"""
         try:
             # Get PR changed files
-            response = requests.get(
-                f'{self.base_url}/pulls/{pr_number}/files',
-                headers=self.headers
-            )
-            response.raise_for_status()
-            
-            changed_files = response.json()
+            changed_files = self._get_pr_file_paths(pr_number)
             
             # Get critical files related to the changes
             security_context = []
-            for file in changed_files:
+            for path in changed_files:
                 file_info = RepoFile(
-                    path=file['filename'],
+                    path=path,
                     type='file',
-                    size=file.get('size', 0)
+                    size=0
                 )
-                file_info.security_score = self._calculate_initial_security_score(file_info)
+                file_info.security_score = self._score(file_info.path)
                 if file_info.security_score > 0.3:  # Threshold for security relevance
                     security_context.append(file_info)
             
-            # Sort and limit context files
-            security_context.sort(key=lambda x: x.security_score, reverse=True)
+            # Select the top context files
             return {
-                'changed_files': [f['filename'] for f in changed_files],
-                'security_context': security_context[:max_context_files]
+                'changed_files': changed_files,
+                'security_context': heapq.nlargest(max_context_files, security_context, key=lambda x: x.security_score)
             }
             
         except requests.exceptions.RequestException as e:
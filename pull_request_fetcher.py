@@ -1,125 +1,399 @@
 import os
 import re
 import io
-import json
+import time
+import shelve
+import atexit
 import requests
+import threading
+from requests.adapters import HTTPAdapter
+from urllib3.util.retry import Retry
+from functools import lru_cache
+from concurrent.futures import ThreadPoolExecutor
 from dotenv import load_dotenv
 
+try:
+    from orjson import loads as json_loads, dumps as json_dumps
+except ImportError:
+    # stdlib fallback writing the same compact UTF-8 JSON as orjson
+    import json
+
+    def json_loads(data):
+        return json.loads(data)
+
+    def json_dumps(obj):
+        return json.dumps(obj, ensure_ascii=False, separators=(',', ':')).encode('utf-8')
+
 load_dotenv()
 
 GITHUB_TOKEN = os.getenv("GITHUB_TOKEN")
 
+# Keep-alive connection pool shared by every Context session, so GitHub calls reuse
+# TLS connections across PRs, transient errors are retried
+_ADAPTER = HTTPAdapter(
+    pool_connections=16,
+    pool_maxsize=32,
+    max_retries=Retry(total=5, backoff_factor=0.5, status_forcelist=[429, 502, 503, 504], raise_on_status=False)
+)
+
+# commit details of all PRs are fetched on one shared pool, so PRs analyzed in
+# parallel by main.py don't each start their own threads
+COMMIT_WORKERS = int(os.getenv('GH_COMMIT_WORKERS', '8'))
+commit_executor = ThreadPoolExecutor(max_workers=COMMIT_WORKERS, thread_name_prefix='commit-fetch')
+
+# main.py threads and the commit pool both call GitHub, this bounds the
+# requests in flight across all of them (GitHub asks to avoid many concurrent calls)
+github_slots = threading.BoundedSemaphore(int(os.getenv('GH_MAX_CONCURRENCY', '10')))
+
+# pages 2..last of a paginated response, fetched together once the first page links them
+page_executor = ThreadPoolExecutor(max_workers=int(os.getenv('GH_PAGE_WORKERS', '4')), thread_name_prefix='page-fetch')
+PAGE_RX = re.compile(r'([?&]page=)(\d+)')
+
+REPOS_URL = "https://api.github.com/repos/"
+
+# list endpoints default to 30 items per page, 100 is the maximum. Not used for a commit's
+# details, their files come 300 per page by default
+PER_PAGE = 100
+
+# GitHub responses by url as (conditional request headers, body, links by rel), revalidated
+# with If-None-Match for the ETag or If-Modified-Since when only Last-Modified was sent
+ETAG_CACHE = 'cache/conditional_responses'
+etag_lock = threading.Lock()
+etag_store = None
+# a commit's details never change and end up in the PR cache, they are not stored again
+COMMIT_URL_RX = re.compile(r'/commits/[0-9a-f]{40}(?:\?|$)')
+
+# PR title, body and commits in one request (per 100 commits) instead of a
+# pulls call followed by paginated commits calls
+PR_QUERY = '''
+query($owner: String!, $name: String!, $pr: Int!, $cursor: String) {
+  repository(owner: $owner, name: $name) {
+    pullRequest(number: $pr) {
+      number
+      title
+      body
+      commits(first: 100, after: $cursor) {
+        nodes { commit { oid message changedFilesIfAvailable } }
+        pageInfo { hasNextPage endCursor }
+      }
+    }
+  }
+}
+'''
+
+# PRs may be fetched from several threads, cache files are read-modify-written under this lock
+cache_lock = threading.Lock()
+# one lock per (owner, name, number), a PR requested again while it is being fetched waits for that fetch
+pr_locks = {}
+
+class RateState:
+    """GitHub quota as reported by the X-RateLimit headers of the last response"""
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.remaining = None
+        self.reset = 0.0
+        self.next_call = 0.0  # monotonic time of the next paced call
+
+    def update(self, headers):
+        # GraphQL has its own quota, only the REST (core) one is tracked
+        if 'X-RateLimit-Remaining' in headers and headers.get('X-RateLimit-Resource', 'core') == 'core':
+            with self.lock:
+                self.remaining = int(headers['X-RateLimit-Remaining'])
+                self.reset = float(headers.get('X-RateLimit-Reset', 0))
+
+    def sleep_if_needed(self, min_remaining=50):
+        """Spread the calls left over the time until reset once the quota runs low, each caller reserves its own slot"""
+        with self.lock:
+            if self.remaining is None or self.remaining >= min_remaining:
+                return
+            now = time.monotonic()
+            slot = max(now, self.next_call)
+            self.next_call = slot + max(0, self.reset - time.time()) / max(self.remaining, 1)
+            self.remaining = max(self.remaining - 1, 0)
+        time.sleep(slot - now)
+
+rate_state = RateState()
+
+RATE_LIMIT_RETRIES = 3
+
+def rate_limit_delay(response):
+    """Seconds to wait before retrying a rate limited response, None if it is not rate limited"""
+    if response.status_code not in (403, 429):
+        return None
+    if 'Retry-After' in response.headers:
+        # secondary rate limits
+        return int(response.headers['Retry-After'])
+    if response.headers.get('X-RateLimit-Remaining') == '0':
+        # primary quota used up, it comes back at X-RateLimit-Reset
+        return max(0, float(response.headers.get('X-RateLimit-Reset', 0)) - time.time()) + 1
+    return None
+
 class Context:
     def __init__(self, repo_owner, repo_name, token):
         self.repo_owner = repo_owner
         self.repo_name = repo_name
         self.token = token
+        # auth and accept headers are set once instead of being rebuilt for every request
+        self.session = requests.Session()
+        self.session.headers.update({
+            'Authorization': f'token {token}',
+            'Accept': 'application/vnd.github.v3+json'
+        })
+        self.session.mount('https://', _ADAPTER)
 
+def __cache_filename(repo_owner, repo_name):
+    # one JSON PR per line, new PRs are appended without rewriting the file
+    return f'cache/{repo_owner}_{repo_name}_prs.jsonl'
+
+# compact JSON puts PR_NUMBER first, so a line's PR is known without parsing its patches
+PR_LINE_RX = re.compile(rb'\{"PR_NUMBER":(\d+),')
+
+@lru_cache(maxsize=32)
 def __get_cached_file(repo_owner, repo_name):
-    filename = f'cache/{repo_owner}_{repo_name}_prs.json'
+    """Cached PR lines of a repository indexed by PR number, read once and kept up to date by __fetch_pr"""
+    filename = __cache_filename(repo_owner, repo_name)
 
+    prs = {}
     if os.path.exists(filename):
-        with open(filename, encoding='utf-8') as json_data:
-            return json.load(json_data)
+        with open(filename, 'rb') as json_data:
+            for line in json_data:
+                match = PR_LINE_RX.match(line)
+                if match:
+                    prs[int(match[1])] = line
+    return prs
 
-def __fetch(context, endpoint):
-    base = "https://api.github.com/repos/"
+def __cached_pr(cached, pr_number):
+    """Parse a PR out of the cache index, only the requested line is decoded"""
+    line = cached.get(pr_number)
+    if line is None:
+        return None
+    try:
+        return json_loads(line)
+    except ValueError:
+        # a line cut short by an interrupted append, that PR is fetched again
+        return None
 
-    headers = {
-        'Authorization': f'token {context.token}',
-        'Accept': 'application/vnd.github.v3+json'
-    }
-    
-    if endpoint.startswith(base):
+def __request(context, method, url, **kwargs):
+    """Send a GitHub request, a rate limited response is waited out and sent again"""
+    for attempt in range(RATE_LIMIT_RETRIES + 1):
+        rate_state.sleep_if_needed()
+        with github_slots:
+            response = context.session.request(method, url, **kwargs)
+        rate_state.update(response.headers)
+
+        delay = rate_limit_delay(response)
+        if delay is None or attempt == RATE_LIMIT_RETRIES:
+            return response
+        # wait for the limit to lift and retry only this request, the caller keeps its progress
+        time.sleep(delay)
+
+def __etags():
+    """The conditional response store, opened on first use and kept open for the process (call under etag_lock)"""
+    global etag_store
+    if etag_store is None:
+        etag_store = shelve.open(ETAG_CACHE)
+        atexit.register(etag_store.close)
+    return etag_store
+
+def __get(context, full_url, project=None):
+    """
+    GET a GitHub url, a 304 for the stored validators reuses the stored body without spending quota.
+    project trims the body to the fields the caller uses before it is stored and returned
+    """
+    storable = not COMMIT_URL_RX.search(full_url)
+    cached = None
+    if storable:
+        with etag_lock:
+            cached = __etags().get(full_url)
+    headers = cached[0] if cached else None
+
+    response = __request(context, 'GET', full_url, headers=headers)
+    if cached and response.status_code == 304:
+        return cached[1], cached[2]
+    response.raise_for_status()  # Raises an HTTPError for bad responses
+
+    body = response.json()
+    if project:
+        body = project(body)
+    # requests already parses the Link header into {rel: {'url': ..., 'rel': ...}}
+    links = response.links
+    validators = {}
+    if 'ETag' in response.headers:
+        validators['If-None-Match'] = response.headers['ETag']
+    elif 'Last-Modified' in response.headers:
+        validators['If-Modified-Since'] = response.headers['Last-Modified']
+    if validators and storable:
+        with etag_lock:
+            etags = __etags()
+            etags[full_url] = (validators, body, links)
+            etags.sync()
+    return body, links
+
+def __fetch(context, endpoint, project=None):
+    if endpoint.startswith(REPOS_URL):
         full_url = endpoint
     else:
-        full_url = f'{base}{context.repo_owner}/{context.repo_name}/{endpoint}'
+        full_url = f'{REPOS_URL}{context.repo_owner}/{context.repo_name}/{endpoint}'
         # if endpoint.startswith('pulls'):
         #     full_url += '?state=all'
 
     rel = 'next'
-    responseJson = []
-    exp = re.compile('\\s*<(?P<url>[^>]+)>;\\s+rel=\"(?P<rel>[^\"]+)"')
+    responseJson = None
 
     while(rel == 'next'):
-        response = requests.get(full_url, headers=headers)
-        response.raise_for_status()  # Raises an HTTPError for bad responses
-        if responseJson == []:
-            responseJson = response.json()
-        else:
-            if not isinstance(responseJson, list):
-                resObj = response.json()
-                if responseJson['sha'] == resObj['sha']:
-                    responseJson['files'] += resObj['files']
-                else:
-                    raise Exception('expected same object on pagination url')
-            else:
-                responseJson += response.json()
+        body, links = __get(context, full_url, project)
+        pages = [body]
         rel = 'last'
 
-        if 'link' in response.headers:
-            links = response.headers['link']
-            parts = links.split(',')
+        nextLink = links.get('next')
+        lastLink = links.get('last')
+        last = PAGE_RX.search(lastLink['url']) if lastLink else None
 
-            nextRel = next((part for part in parts if 'rel="next"' in part), None)
+        if nextLink and last and responseJson is None:
+            # the first page links the last one, so every page url is known: fetch them
+            # together instead of following the next links one round trip at a time
+            page_urls = [PAGE_RX.sub(lambda m: m.group(1) + str(page), lastLink['url']) for page in range(2, int(last.group(2)) + 1)]
+            pages += [page for page, _ in page_executor.map(lambda url: __get(context, url, project), page_urls)]
+        elif nextLink:
+            full_url = nextLink['url']
+            rel = 'next'
 
-            if nextRel:
-                m = exp.search(nextRel)
-                full_url = m.group('url')
-                rel = m.group('rel')
+        # later pages are added to the first page's list in place
+        for body in pages:
+            if responseJson is None:
+                responseJson = body
+            else:
+                if not isinstance(responseJson, list):
+                    resObj = body
+                    if responseJson['sha'] == resObj['sha']:
+                        responseJson['files'].extend(resObj['files'])
+                    else:
+                        raise Exception('expected same object on pagination url')
+                else:
+                    responseJson.extend(body)
     return responseJson
 
+def __pr_numbers(prs):
+    return [{'number': pr['number']} for pr in prs]
+
+def __commit_files(commit):
+    # commit details also carry the author, stats and per file urls and blob shas,
+    # only the sha (to check pagination) and the file names, changes and patches are used
+    return {
+        'sha': commit['sha'],
+        'files': [{key: file[key] for key in ('filename', 'changes', 'patch') if key in file} for file in commit['files']]
+    }
+
+def fetch_pr_numbers(repo_owner, repo_name, limit=None):
+    """Numbers of the repo PRs (open and closed), newest first, only the first limit of them when given"""
+    context = Context(repo_owner, repo_name, GITHUB_TOKEN)
+    if limit is None:
+        return [pr['number'] for pr in __fetch(context, f'pulls?state=all&per_page={PER_PAGE}', __pr_numbers)]
+
+    # follow the next links only while more numbers are needed instead of listing every page
+    numbers = []
+    url = f'{REPOS_URL}{repo_owner}/{repo_name}/pulls?state=all&per_page={min(limit, PER_PAGE)}'
+    while url and len(numbers) < limit:
+        prs, links = __get(context, url, __pr_numbers)
+        numbers += [pr['number'] for pr in prs]
+        url = links.get('next', {}).get('url')
+    return numbers[:limit]
+
 def fetch_pr(repo_owner, repo_name, pr_number):
-    prs = __get_cached_file(repo_owner, repo_name)
-    if not prs:
-        return __fetch_pr(repo_owner, repo_name, pr_number)
-    else:
-        filtered = [pr for pr in prs if pr['PR_NUMBER'] == pr_number]
-        if not filtered:
-            return __fetch_pr(repo_owner, repo_name, pr_number)
-        else:
-            return filtered[0]
+    # the index is keyed by GitHub's integer PR number, and GraphQL requires an Int
+    pr_number = int(pr_number)
+    pr = __cached_pr(__get_cached_file(repo_owner, repo_name), pr_number)
+    if pr:
+        return pr
+
+    with cache_lock:
+        pr_lock = pr_locks.setdefault((repo_owner, repo_name, pr_number), threading.Lock())
+    with pr_lock:
+        # cached by another thread while this one waited
+        cached = __get_cached_file(repo_owner, repo_name)
+        return __cached_pr(cached, pr_number) or __fetch_pr(repo_owner, repo_name, pr_number, cached)
     
-def __fetch_pr(repo_owner, repo_name, pr_number):
+def __fetch_pr_graphql(context, pr_number):
+    """PR number, title, body and commits through GraphQL, None if GraphQL reports an error"""
+    pr = None
+    cursor = None
+
+    while True:
+        response = __request(context, 'POST', 'https://api.github.com/graphql', json={
+            'query': PR_QUERY,
+            'variables': {'owner': context.repo_owner, 'name': context.repo_name, 'pr': pr_number, 'cursor': cursor}
+        })
+        response.raise_for_status()
+        result = response.json()
+        if result.get('errors'):
+            return None
+
+        page = result['data']['repository']['pullRequest']
+        if pr is None:
+            # REST returns null for an empty description, GraphQL an empty string
+            pr = {'number': page['number'], 'title': page['title'], 'body': page['body'] or None, 'commits': []}
+        pr['commits'].extend(node['commit'] for node in page['commits']['nodes'])
+
+        if not page['commits']['pageInfo']['hasNextPage']:
+            return pr
+        cursor = page['commits']['pageInfo']['endCursor']
+
+def __fetch_pr(repo_owner, repo_name, pr_number, cached):
+    """Fetch a PR from GitHub, append it to the cache file and add its line to cached, the file's PR index"""
     context = Context(repo_owner, repo_name, GITHUB_TOKEN)
 
-    pr = __fetch(context, f"pulls/{pr_number}")
+    pr = __fetch_pr_graphql(context, pr_number)
+    if pr is None:
+        # not visible through GraphQL (e.g. missing PR), the REST calls raise the matching HTTPError
+        rest_pr = __fetch(context, f"pulls/{pr_number}")
+        pr = {
+            'number': rest_pr['number'],
+            'title': rest_pr['title'],
+            'body': rest_pr['body'],
+            'commits': [
+                {'oid': commit['sha'], 'message': commit['commit']['message'], 'changedFilesIfAvailable': None}
+                for commit in __fetch(context, f"{rest_pr['commits_url']}?per_page={PER_PAGE}")
+            ]
+        }
 
     pr_obj = {}
     pr_obj['PR_NUMBER'] = pr['number']
-    commits =  __fetch(context, pr['commits_url'])
+    commits = pr['commits']
     pr_obj['PR_TITLE'] = pr['title']
     pr_obj['PR_BODY'] = pr['body']
 
     commits_array = []
     pr_obj['COMMITS'] = commits_array
     
-    for commit in commits:
+    def commit_files(commit):
+        # a commit known to change no files has no patches, skip its request
+        if commit['changedFilesIfAvailable'] == 0:
+            return []
+        return __fetch(context, f"commits/{commit['oid']}", __commit_files)['files']
+
+    # patches are only available from the REST commit details, these are independent
+    # requests so fetch them concurrently (map keeps commit order)
+    commit_file_lists = list(commit_executor.map(commit_files, commits))
+
+    for commit, files in zip(commits, commit_file_lists):
         commit_obj = {}
-        commit_obj['COMMIT_MESSAGE'] = commit['commit']['message']
-        content = __fetch(context, commit['url'])
-        files = content['files']
-        
-        files_array = []
-        commit_obj['COMMIT_FILES'] = files_array
-        
-        for file in filter(lambda f: f['changes'] > 0 and 'patch' in f, files):
-            file_obj = {}
-            file_obj['FILE_NAME'] = file['filename']
-            file_obj['FILE_PATCH'] = file['patch']
-            files_array.append(file_obj)
-        
+        commit_obj['COMMIT_MESSAGE'] = commit['message']
+        commit_obj['COMMIT_FILES'] = [
+            {'FILE_NAME': file['filename'], 'FILE_PATCH': file['patch']}
+            for file in files if file['changes'] > 0 and 'patch' in file
+        ]
         commits_array.append(commit_obj)
 
-    cached_prs = []
-    if os.path.exists(f'cache/{repo_owner}_{repo_name}_prs.json'):
-        with open(f'cache/{repo_owner}_{repo_name}_prs.json', "r", encoding='utf-8') as file:
-            cached_prs = json.load(file)
-    
-    cached_prs.append(pr_obj)
-
-    with open(f'cache/{repo_owner}_{repo_name}_prs.json', "wb") as file:
-        cached_prs = json.dumps(cached_prs, ensure_ascii=False)
-        file.write(cached_prs.encode('utf-8'))
+    with cache_lock:
+        # one appended line, an interrupted write can only damage this PR's own line
+        line = json_dumps(pr_obj) + b'\n'
+        with open(__cache_filename(repo_owner, repo_name), "ab+") as file:
+            if file.seek(0, os.SEEK_END):
+                # start on a new line if an interrupted append left a partial one
+                file.seek(-1, os.SEEK_END)
+                if file.read(1) != b'\n':
+                    file.write(b'\n')
+            file.write(line)
+        cached[pr_obj['PR_NUMBER']] = line
 
     return pr_obj
\ No newline at end of file